@@ -1,78 +1,209 @@
-#!/usr/bin/env python3
-"""
+#!/usr/bin/env python3
+"""
 Installation script for ComfyUI-TRELLIS2 with ComfyUI venv.
 
 This script installs all dependencies into ComfyUI's main venv.
-"""
-
+"""
+
 import sys
 import os
-import platform
-import subprocess
-from pathlib import Path
-
-
+import re
+
+# subprocess, pathlib and friends are imported inside the functions that
+# need them so a short-circuiting rerun pays no import cost for them.
+
+
 # =============================================================================
 # ComfyUI venv helpers
 # =============================================================================
 
+_VENV_PY_CACHE = {}
+
+
 def _get_comfyui_venv_python(node_root):
-    """Return ComfyUI venv python path if it exists, otherwise None."""
-    comfyui_root = node_root.parent.parent
-    python_path = comfyui_root / "venv" / "bin" / "python"
-    return python_path if python_path.exists() else None
+    """Return ComfyUI venv python path if it exists, otherwise None.
 
+    Probes the POSIX and Windows layouts in order and caches the result per
+    node root, so repeat calls within one install run cost no stat calls.
+    """
+    key = str(node_root)
+    if key in _VENV_PY_CACHE:
+        return _VENV_PY_CACHE[key]
 
-def ensure_venv_requirements(node_root):
-    """Install requirements.txt into the ComfyUI venv."""
-    req_path = node_root / "requirements.txt"
-    if not req_path.exists():
-        print(f"[TRELLIS2] requirements.txt not found at {req_path}")
-        return False
+    venv_root = node_root.parent.parent / "venv"
+    python_path = None
+    for subpath in (("bin", "python"), ("Scripts", "python.exe")):
+        candidate = venv_root.joinpath(*subpath)
+        if candidate.exists():
+            python_path = candidate
+            break
+
+    _VENV_PY_CACHE[key] = python_path
+    return python_path
 
-    venv_python = _get_comfyui_venv_python(node_root)
-    python_exec = str(venv_python) if venv_python else sys.executable
-    if venv_python:
-        print(f"[TRELLIS2] Using ComfyUI venv python: {venv_python}")
-    else:
-        print("[TRELLIS2] ComfyUI venv python not found; using current Python.")
 
+_POOL = None
+
+
+def _get_pool():
+    """Lazily create the shared keep-alive connection pool (None if urllib3 is unavailable)."""
+    global _POOL
+    if _POOL is None:
+        try:
+            import urllib3
+            _POOL = urllib3.PoolManager(
+                maxsize=8,
+                timeout=urllib3.Timeout(connect=60, read=60),
+                retries=urllib3.Retry(
+                    total=5,
+                    backoff_factor=0.5,
+                    status_forcelist=(500, 502, 503, 504),
+                ),
+            )
+        except Exception:
+            _POOL = False
+    return _POOL or None
+
+
+def _download_wheel(url, dest_dir):
+    """Download a single wheel URL into dest_dir, returning the local path."""
+    path = dest_dir / url.rsplit("/", 1)[-1]
+    part_path = path.with_name(path.name + ".part")
+    pool = _get_pool()
     try:
-        result = subprocess.run(
-            [python_exec, "-m", "pip", "install", "-r", str(req_path)],
-            check=False
-        )
+        with open(part_path, "wb", buffering=8 * 1024 * 1024) as f:
+            if pool is not None:
+                response = pool.request("GET", url, preload_content=False)
+                try:
+                    # urllib3 does not raise on HTTP errors; without this
+                    # check an error body would be cached as a .whl.
+                    if response.status >= 400:
+                        raise OSError(f"HTTP {response.status} for {url}")
+                    for chunk in response.stream(1024 * 1024, decode_content=False):
+                        f.write(chunk)
+                finally:
+                    response.release_conn()
+            else:
+                import urllib.request
+                with urllib.request.urlopen(url, timeout=60) as response:
+                    while True:
+                        chunk = response.read(1024 * 1024)
+                        if not chunk:
+                            break
+                        f.write(chunk)
+    except Exception:
+        try:
+            os.unlink(part_path)
+        except OSError:
+            pass
+        raise
+    os.replace(part_path, path)
+    return path
+
+
+def _download_wheels_parallel(urls, dest_dir):
+    """Fetch wheel URLs concurrently into dest_dir.
+
+    Returns the list of local paths, or None if any download failed so the
+    caller can fall back to handing the URLs to pip directly.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    try:
+        with ThreadPoolExecutor(max_workers=min(len(urls), 5)) as executor:
+            return list(executor.map(lambda url: _download_wheel(url, dest_dir), urls))
     except Exception as e:
-        print(f"[TRELLIS2] Failed to run pip: {e}")
-        return False
+        print(f"[TRELLIS2] Parallel wheel download failed ({e}); falling back to pip URLs.")
+        return None
 
-    if result.returncode != 0:
-        print(f"[TRELLIS2] pip exited with code {result.returncode}")
-        return False
 
-    return True
+def _run_pip(python_exec, pip_args):
+    """Run pip with the given arguments, returning its exit code.
+
+    When python_exec is the current interpreter there is no venv boundary to
+    cross, so pip is invoked in-process and the ~1-3 s interpreter plus pip
+    import cold-start of a subprocess is skipped. Falls back to a subprocess
+    if the (private) pip API is unavailable.
+    """
+    if python_exec == sys.executable:
+        try:
+            from pip._internal.cli.main import main as pip_main
+        except Exception:
+            pass
+        else:
+            return pip_main(list(pip_args))
+    import subprocess
+    return subprocess.run([python_exec, "-m", "pip", *pip_args], check=False).returncode
+
+
+def _cached_wheel_paths(urls, cache_dir):
+    """Return local paths for the wheel URLs, downloading only cache misses.
+
+    The wheel URLs are immutable HuggingFace dataset revisions, so a wheel
+    already present under cache_dir (keyed by filename) is reused as-is.
+    Returns None if any missing wheel failed to download, so the caller can
+    fall back to handing the URLs to pip directly.
+    """
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    to_fetch = [url for url in urls if not (cache_dir / url.rsplit("/", 1)[-1]).exists()]
+    if to_fetch and _download_wheels_parallel(to_fetch, cache_dir) is None:
+        return None
+    return [cache_dir / url.rsplit("/", 1)[-1] for url in urls]
+
+
+_SEP_RE = re.compile(r"[;,]")
+
+
+def _missing_modules(python_exec, modules):
+    """Return the subset of modules that python_exec cannot import.
+
+    When python_exec is a different venv python, the probe must run there -
+    find_spec in the calling interpreter says nothing about the target
+    environment. If the probe subprocess fails, every module is reported
+    missing so the install still happens.
+    """
+    if python_exec == sys.executable:
+        import importlib.util
+        return [name for name in modules if importlib.util.find_spec(name) is None]
+
+    import subprocess
+    script = (
+        "import importlib.util, sys\n"
+        "print(' '.join(m for m in sys.argv[1:]"
+        " if importlib.util.find_spec(m) is None))\n"
+    )
+    try:
+        result = subprocess.run(
+            [python_exec, "-c", script, *modules],
+            capture_output=True, text=True, check=True,
+        )
+    except Exception:
+        return list(modules)
+    return result.stdout.split()
 
 
 def _split_env_list(value):
     if not value:
         return []
-    parts = []
-    for item in value.replace(";", ",").split(","):
-        item = item.strip()
-        if item:
-            parts.append(item)
-    return parts
-
-
-def ensure_cuda_packages(node_root):
-    """Install CUDA extension packages into the ComfyUI venv."""
-    wheel_urls = [
-        "https://huggingface.co/datasets/arcticlatent/trellis2/resolve/main/cumesh-0.0.1-cp312-cp312-linux_x86_64.whl",
-        "https://huggingface.co/datasets/arcticlatent/trellis2/resolve/main/flex_gemm-1.0.0-cp312-cp312-linux_x86_64.whl",
-        "https://huggingface.co/datasets/arcticlatent/trellis2/resolve/main/nvdiffrast-0.4.0-cp312-cp312-linux_x86_64.whl",
-        "https://huggingface.co/datasets/arcticlatent/trellis2/resolve/main/nvdiffrec_render-0.0.0-cp312-cp312-linux_x86_64.whl",
-        "https://huggingface.co/datasets/arcticlatent/trellis2/resolve/main/o_voxel-0.0.1-cp312-cp312-linux_x86_64.whl",
-    ]
+    return [part for part in (item.strip() for item in _SEP_RE.split(value)) if part]
+
+
+def ensure_all_packages(node_root):
+    """Install requirements.txt and any missing CUDA wheels in one pip run."""
+    from pathlib import Path
+
+    req_path = node_root / "requirements.txt"
+    if not req_path.exists():
+        print(f"[TRELLIS2] requirements.txt not found at {req_path}")
+        return False
+
+    wheels_by_module = {
+        "cumesh": "https://huggingface.co/datasets/arcticlatent/trellis2/resolve/main/cumesh-0.0.1-cp312-cp312-linux_x86_64.whl",
+        "flex_gemm": "https://huggingface.co/datasets/arcticlatent/trellis2/resolve/main/flex_gemm-1.0.0-cp312-cp312-linux_x86_64.whl",
+        "nvdiffrast": "https://huggingface.co/datasets/arcticlatent/trellis2/resolve/main/nvdiffrast-0.4.0-cp312-cp312-linux_x86_64.whl",
+        "nvdiffrec_render": "https://huggingface.co/datasets/arcticlatent/trellis2/resolve/main/nvdiffrec_render-0.0.0-cp312-cp312-linux_x86_64.whl",
+        "o_voxel": "https://huggingface.co/datasets/arcticlatent/trellis2/resolve/main/o_voxel-0.0.1-cp312-cp312-linux_x86_64.whl",
+    }
     venv_python = _get_comfyui_venv_python(node_root)
     python_exec = str(venv_python) if venv_python else sys.executable
     if venv_python:
@@ -80,28 +211,73 @@ def ensure_cuda_packages(node_root):
     else:
         print("[TRELLIS2] ComfyUI venv python not found; using current Python.")
 
+    missing = _missing_modules(python_exec, list(wheels_by_module))
+    wheel_urls = [wheels_by_module[name] for name in missing]
+    if missing:
+        print(f"[TRELLIS2] CUDA extension packages to install: {', '.join(missing)}")
+    else:
+        print("[TRELLIS2] CUDA extension packages already installed.")
+
     extra_index_urls = _split_env_list(os.environ.get("TRELLIS2_WHEEL_INDEX_URL"))
     find_links = _split_env_list(os.environ.get("TRELLIS2_WHEEL_FIND_LINKS"))
 
-    cmd = [python_exec, "-m", "pip", "install", *wheel_urls]
-    for url in extra_index_urls:
-        cmd.extend(["--extra-index-url", url])
-    for link in find_links:
-        cmd.extend(["--find-links", link])
-
     if extra_index_urls or find_links:
         print("[TRELLIS2] Using custom wheel sources for CUDA packages.")
-    else:
-        print("[TRELLIS2] No custom wheel sources set for CUDA packages.")
 
+    import tempfile
+
+    wheel_req_path = None
     try:
-        result = subprocess.run(cmd, check=False)
+        wheel_args = []
+        if wheel_urls:
+            cache_dir = Path(os.environ.get(
+                "TRELLIS2_WHEEL_CACHE", node_root / ".wheel_cache"))
+            wheel_paths = _cached_wheel_paths(wheel_urls, cache_dir)
+            wheel_args = [str(p) for p in wheel_paths] if wheel_paths else wheel_urls
+
+        # One pip invocation for requirements plus any missing wheels.
+        # The wheel-only resolver-skip flags (--no-deps etc.) do not
+        # apply here because requirements.txt needs its transitive deps.
+        # Keep pip's HTTP/wheel cache next to the node install so it
+        # survives container rebuilds that wipe ~/.cache/pip. Override
+        # with TRELLIS2_PIP_CACHE.
+        pip_cache_dir = os.environ.get(
+            "TRELLIS2_PIP_CACHE", str(node_root / ".pip_cache"))
+
+        pip_args = [
+            "install",
+            "--disable-pip-version-check", "--no-input",
+            "--prefer-binary", "--no-compile",
+            "--cache-dir", pip_cache_dir,
+            "-r", str(req_path),
+        ]
+        if wheel_args:
+            # Feed the wheels through a requirements file rather than as
+            # command-line arguments: pip batches downloads given via -r,
+            # which command-line URL mixes do not get.
+            fd, wheel_req_path = tempfile.mkstemp(
+                suffix=".txt", prefix="trellis2-wheels-")
+            with os.fdopen(fd, "w") as f:
+                f.write("\n".join(wheel_args) + "\n")
+            pip_args.extend(["-r", wheel_req_path])
+        for url in extra_index_urls:
+            pip_args.extend(["--extra-index-url", url])
+        for link in find_links:
+            pip_args.extend(["--find-links", link])
+
+        returncode = _run_pip(python_exec, pip_args)
     except Exception as e:
         print(f"[TRELLIS2] Failed to run pip: {e}")
         return False
+    finally:
+        if wheel_req_path is not None:
+            try:
+                os.unlink(wheel_req_path)
+            except OSError:
+                pass
 
-    if result.returncode != 0:
-        print(f"[TRELLIS2] pip exited with code {result.returncode}")
+    if returncode != 0:
+        print(f"[TRELLIS2] pip exited with code {returncode}")
         print("[TRELLIS2] If these wheels are not on PyPI, set:")
         print("  TRELLIS2_WHEEL_INDEX_URL=https://... (comma-separated for multiple)")
         print("  TRELLIS2_WHEEL_FIND_LINKS=/path/to/wheels (comma-separated for multiple)")
@@ -120,18 +296,17 @@ def main():
     print("ComfyUI-TRELLIS2 Installation (ComfyUI venv)")
     print("=" * 60)
 
+    from pathlib import Path
+
     node_root = Path(__file__).parent.absolute()
 
     print("[TRELLIS2] Installing requirements into ComfyUI venv.")
-    if not ensure_venv_requirements(node_root):
-        print("[TRELLIS2] ERROR: Failed to install requirements into venv.")
-        return 1
-    if not ensure_cuda_packages(node_root):
-        print("[TRELLIS2] ERROR: Failed to install CUDA extension packages.")
+    if not ensure_all_packages(node_root):
+        print("[TRELLIS2] ERROR: Failed to install dependencies into venv.")
         return 1
     return 0
-
-
-
-if __name__ == "__main__":
-    sys.exit(main())
+
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,13 +1,13 @@
 """Isolation helper that runs nodes directly in the ComfyUI venv."""
 
 
-def _noop_isolated(*_args, **_kwargs):
-    def decorator(obj):
-        return obj
-    return decorator
+def _identity(obj):
+    return obj
 
 
 def isolated(*_args, **_kwargs):
-    return _noop_isolated(*_args, **_kwargs)
+    # One prebuilt decorator shared by every call site; nothing is isolated
+    # when running in the ComfyUI venv, so no per-call closure is needed.
+    return _identity
 
 __all__ = ["isolated"]
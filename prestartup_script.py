@@ -1,31 +1,49 @@
-"""Pre-startup script for ComfyUI-TRELLIS2.
-
+"""Pre-startup script for ComfyUI-TRELLIS2.
+
 This script runs before ComfyUI initializes. It copies example assets
 and ensures required CUDA wheels are installed into the active venv.
-"""
+"""
 import os
 import shutil
-import subprocess
-import sys
 import importlib.util
-
-
+
+
 def copy_assets_to_input():
-    """Copy example assets to ComfyUI input directory."""
-    script_dir = os.path.dirname(__file__)
-    comfyui_root = os.path.dirname(os.path.dirname(script_dir))
-
-    assets_src = os.path.join(script_dir, "assets")
-    input_dst = os.path.join(comfyui_root, "input")
-
-    if os.path.exists(assets_src):
-        os.makedirs(input_dst, exist_ok=True)
-        for asset in os.listdir(assets_src):
-            src = os.path.join(assets_src, asset)
-            dst = os.path.join(input_dst, asset)
-            if os.path.isfile(src) and not os.path.exists(dst):
-                shutil.copy2(src, dst)
-                print(f"[TRELLIS2] Copied asset: {asset}")
+    """Copy example assets to ComfyUI input directory."""
+    script_dir = os.path.dirname(__file__)
+    comfyui_root = os.path.dirname(os.path.dirname(script_dir))
+
+    assets_src = os.path.join(script_dir, "assets")
+    input_dst = os.path.join(comfyui_root, "input")
+
+    if not os.path.exists(assets_src):
+        return
+    os.makedirs(input_dst, exist_ok=True)
+
+    # os.scandir folds the is-file check into the directory read, so each
+    # entry costs one syscall instead of a listdir + stat pair.
+    tasks = []
+    with os.scandir(assets_src) as entries:
+        for entry in entries:
+            dst = os.path.join(input_dst, entry.name)
+            if entry.is_file() and not os.path.exists(dst):
+                tasks.append((entry.path, dst, entry.name))
+
+    if not tasks:
+        return
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    def _copy(task):
+        src, dst, name = task
+        # copyfile skips copy2's metadata syscalls and uses the kernel
+        # zero-copy path where available; original mtimes don't matter
+        # for example inputs.
+        shutil.copyfile(src, dst)
+        print(f"[TRELLIS2] Copied asset: {name}")
+
+    with ThreadPoolExecutor(max_workers=min(len(tasks), 8)) as executor:
+        list(executor.map(_copy, tasks))
 
 
 def _ensure_cuda_wheels():
@@ -43,8 +61,26 @@ def _ensure_cuda_wheels():
         return
 
     print(f"[TRELLIS2] Installing CUDA wheels into venv (missing: {', '.join(missing)})...")
+    # Only the slow path needs these; the steady-state startup skips them.
+    import subprocess
+    import sys
+
+    # Node-local pip cache that survives container rebuilds; same default
+    # and override as install.py.
+    pip_cache_dir = os.environ.get(
+        "TRELLIS2_PIP_CACHE", os.path.join(os.path.dirname(__file__), ".pip_cache"))
+
     try:
-        result = subprocess.run([sys.executable, "-m", "pip", "install", *wheel_urls], check=False)
+        result = subprocess.run(
+            [
+                sys.executable, "-m", "pip", "install",
+                "--no-deps", "--no-build-isolation", "--only-binary=:all:",
+                "--disable-pip-version-check", "--no-input", "--no-compile",
+                "--cache-dir", pip_cache_dir,
+                *wheel_urls,
+            ],
+            check=False,
+        )
     except Exception as e:
         print(f"[TRELLIS2] Failed to install CUDA wheels: {e}")
         return